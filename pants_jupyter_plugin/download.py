@@ -1,14 +1,17 @@
 # Copyright 2021 Pants project contributors (see CONTRIBUTORS.md).
 # Licensed under the Apache License, Version 2.0 (see LICENSE).
 
-import io
+import os
+import shutil
 from pathlib import Path
-from typing import Callable
+from typing import BinaryIO, Callable
 from uuid import uuid4
 
 import requests
 
-from pants_jupyter_plugin.lock import creation_lock
+from pants_jupyter_plugin.lock import creation_lock, finalize_creation
+
+_COPY_BUFFER_SIZE = 1024 * 1024
 
 
 class DownloadError(Exception):
@@ -16,20 +19,24 @@ class DownloadError(Exception):
 
 
 def download_once(
-    url: str, path: Path, post_process: Callable[[Path], None] = lambda _: None
+    url: str, path: Path, post_process: Callable[[Path, BinaryIO], None] = lambda _, __: None
 ) -> None:
     """Downloads a file from the given url to the given path exactly once.
 
-    If a post_process function is given, it's passed the path of the temporary download file to
-    inspect or post-process in any way seen fit except moving the file.
+    If a post_process function is given, it's passed the path of the temporary download file along
+    with an open read-write handle to it to inspect or post-process in any way seen fit except
+    moving the file.
     """
     with creation_lock(path) as locked:
         if locked:
             download_to = path.parent / f"{path.name}.{uuid4().hex}"
-            with requests.get(url=url, stream=True) as response, download_to.open(mode="wb") as fp:
+            with requests.get(url=url, stream=True) as response, download_to.open(mode="w+b") as fp:
                 if not response.ok:
                     raise DownloadError(f"GET of {url} returned {response.status_code}.")
-                for chunk in response.iter_content(chunk_size=io.DEFAULT_BUFFER_SIZE):
-                    fp.write(chunk)
-            post_process(download_to)
-            download_to.rename(path)
+                # N.B.: We copy from the raw stream in large blocks to keep the copy loop out of
+                # Python; so we must ask urllib3 to undo any Content-Encoding for us.
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, fp, length=_COPY_BUFFER_SIZE)
+                fp.flush()
+                post_process(download_to, fp)
+            finalize_creation(download_to, path)
@@ -5,7 +5,19 @@ import os
 import sys
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Iterable, Iterator, List, Mapping, Union
+from typing import (
+    Any,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 
 def create(**env_vars: Any) -> Mapping[str, str]:
@@ -24,33 +36,72 @@ def create(**env_vars: Any) -> Mapping[str, str]:
     return env
 
 
+def _file_id(path: str) -> Optional[Tuple[int, int]]:
+    """Returns the device and inode of the given path if it exists."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def _scrub(entries: Sequence[Path], module_names: Iterable[str]) -> None:
+    """Removes the given sys.path entries and any of the named modules imported from them."""
+    # N.B.: We compute the entries to scrub once up front so that scrubbing is a single pass over
+    # each of sys.path and sys.modules regardless of how many entries there are.
+    sys_path_entries: Set[str] = set()
+    sys_path_entry_ids: Set[Tuple[int, int]] = set()
+    for sys_path_entry in entries:
+        sys_path_entries.add(str(sys_path_entry))
+        sys_path_entries.add(os.path.realpath(sys_path_entry))
+        sys_path_entry_id = _file_id(str(sys_path_entry))
+        if sys_path_entry_id is not None:
+            sys_path_entry_ids.add(sys_path_entry_id)
+    sys.path[:] = [
+        entry
+        for entry in sys.path
+        if entry not in sys_path_entries and _file_id(entry) not in sys_path_entry_ids
+    ]
+
+    # N.B.: We snapshot just the module files up front so the scan below is a tight loop of string
+    # prefix checks that only touches sys.modules to delete the modules we find.
+    module_files = [
+        (module_path, name)
+        for name, module_path in (
+            (name, getattr(sys.modules.get(name), "__file__", None)) for name in list(module_names)
+        )
+        if module_path
+    ]
+    module_path_prefixes = tuple(os.path.join(entry, "") for entry in sys_path_entries)
+    for module_path, name in module_files:
+        if module_path.startswith(module_path_prefixes):
+            del sys.modules[name]
+
+
 @dataclass
 class EnvManager:
     mounted: List[Path] = field(default_factory=list, hash=False)
+    _premount_modules: FrozenSet[str] = field(default_factory=frozenset, init=False, repr=False)
 
     def unmount(self) -> Iterator[Path]:
         """Scrubs sys.path and sys.modules of any contents from previously mounted environments.
 
         WARNING: This will irreversibly mutate sys.path and sys.modules each time it's called.
         """
-        while self.mounted:
-            sys_path_entry = self.mounted.pop()
-            sys.path[:] = [
-                entry
-                for entry in sys.path
-                if entry and os.path.exists(entry) and not sys_path_entry.samefile(entry)
-            ]
-
-            for name, module in list(sys.modules.items()):
-                module_path = getattr(module, "__file__", None)
-                if module_path is not None:
-                    if sys_path_entry in Path(module_path).parents:
-                        del sys.modules[name]
+        unmounted = self.mounted[::-1]
+        self.mounted.clear()
+
+        # N.B.: Mounted entries are appended to sys.path; so modules imported before the first
+        # mount could not have come from them and we need only consider modules imported since.
+        _scrub(unmounted, module_names=sys.modules.keys() - self._premount_modules)
 
+        for sys_path_entry in unmounted:
             yield sys_path_entry
 
     def mount(self, path_parts: Iterable[Path]) -> Iterator[Path]:
         """Mounts an iterable of path parts to sys.path."""
+        if not self.mounted:
+            self._premount_modules = frozenset(sys.modules)
         for path_entry in path_parts:
             sys.path.append(str(path_entry))
             self.mounted.append(path_entry)
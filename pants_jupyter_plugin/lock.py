@@ -1,6 +1,8 @@
 # Copyright 2021 Pants project contributors (see CONTRIBUTORS.md).
 # Licensed under the Apache License, Version 2.0 (see LICENSE).
 
+import errno
+import os
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Iterator, Optional
@@ -15,7 +17,10 @@ def creation_lock(path: Path) -> Iterator[Optional[str]]:
     The lock should be considered an opaque token. If its not None, the file does not exist and the
     lock to create the file has been acquired. If it is None, the file was already created.
 
-    This is a blocking lock but otherwise safe lock.
+    This is a blocking lock but otherwise safe lock. When the path already exists this costs just a
+    stat. Otherwise an OS file lock is used instead of a cheaper `O_CREAT | O_EXCL` sentinel file
+    since the OS releases file locks when their holder dies; so a creator that crashes cannot wedge
+    later creators waiting on a stale sentinel.
     """
     if path.exists():
         yield None
@@ -25,3 +30,37 @@ def creation_lock(path: Path) -> Iterator[Optional[str]]:
     lock_file = f"{path}.lock"
     with FileLock(lock_file):
         yield None if path.exists() else lock_file
+
+
+def _fsync(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        # N.B.: Some filesystems do not support fsyncing directories; there we make do with
+        # whatever durability they provide instead of failing a creation that otherwise succeeded.
+        if e.errno != errno.EINVAL:
+            raise
+    finally:
+        os.close(fd)
+
+
+def finalize_creation(created: Path, path: Path) -> None:
+    """Atomically moves a file or directory created under a temporary name into place at path.
+
+    The contents of the created file or directory are flushed to disk before it's moved into place
+    and the move is made durable after; so a crash cannot leave a path behind that looks created to
+    `creation_lock` but is not.
+    """
+    if created.is_dir():
+        for root, dirs, files in os.walk(created):
+            for name in files:
+                file_path = os.path.join(root, name)
+                # N.B.: Symlinks (like a venv's python) point outside of what we created.
+                if not os.path.islink(file_path):
+                    _fsync(file_path)
+            _fsync(root)
+    else:
+        _fsync(str(created))
+    os.replace(created, path)
+    _fsync(str(path.parent))
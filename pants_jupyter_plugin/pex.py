@@ -1,22 +1,40 @@
 # Copyright 2021 Pants project contributors (see CONTRIBUTORS.md).
 # Licensed under the Apache License, Version 2.0 (see LICENSE).
 
+import functools
 import hashlib
 import json
 import os
+import platform
+import re
 import subprocess
 import sys
+import threading
 import zipfile
 from dataclasses import dataclass, field
 from pathlib import Path
 from textwrap import dedent
-from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 from uuid import uuid4
 
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+
 from pants_jupyter_plugin import cache, env
 from pants_jupyter_plugin.download import DownloadError, download_once
 from pants_jupyter_plugin.env import EnvManager
-from pants_jupyter_plugin.lock import creation_lock
+from pants_jupyter_plugin.lock import creation_lock, finalize_creation
 
 _CACHE = cache.DIR / "pex"
 
@@ -32,22 +50,172 @@ class Pex:
         The PEX file will be sanity checked to at least be a zip file and made executable.
         """
 
-        def activate_pex(path: Path) -> None:
-            if not zipfile.is_zipfile(path):
+        def activate_pex(path: Path, fp: BinaryIO) -> None:
+            if not zipfile.is_zipfile(fp):
                 raise DownloadError(
                     f"The PEX at {url} was downloaded to {path} but it does not appear to be a "
                     "valid zip file."
                 )
-            path.chmod(0o755)
+            os.fchmod(fp.fileno(), 0o755)
 
         download_once(url, download_to, post_process=activate_pex)
 
     @classmethod
     def load(cls, version: str) -> "Pex":
-        url = f"https://github.com/pantsbuild/pex/releases/download/v{version}/pex"
-        pex_exe = _CACHE / "exes" / f"pex-{version}.pex"
-        cls.download_once(url, pex_exe)
-        return cls(exe=pex_exe)
+        pex = _LOADED_PEXES.get(version)
+        if pex is None:
+            url = f"https://github.com/pantsbuild/pex/releases/download/v{version}/pex"
+            pex_exe = _CACHE / "exes" / f"pex-{version}.pex"
+            cls.download_once(url, pex_exe)
+            _LOADED_PEXES[version] = pex = cls(exe=pex_exe)
+        return pex
+
+    def run_tool(self, pex_file: Path, args: Iterable[str], **subprocess_args: Any) -> bytes:
+        """Runs the given PEX tool against the given PEX file and returns its stdout, if any.
+
+        The current interpreter is forced as the PEX file's interpreter, or else the tool fails if
+        the current interpreter is not compatible with the PEX file's interpreter constraints.
+        """
+        return (
+            subprocess.run(
+                args=[sys.executable, str(self.exe), "-m", "pex.tools", str(pex_file), *args],
+                env=env.create(PEX_INTERPRETER=1, PEX_PYTHON_PATH=sys.executable),
+                check=True,
+                **subprocess_args,
+            ).stdout
+            or b""
+        )
+
+
+_LOADED_PEXES: Dict[str, Pex] = {}
+
+
+def pex_info(pex_file: Path) -> Mapping[str, Any]:
+    """Returns the PEX-INFO of the given PEX file.
+
+    The PEX-INFO is read directly from the PEX file instead of via the `info` PEX tool to save
+    spawning a subprocess. The result is cached for as long as the PEX file is not modified.
+    """
+    stat = pex_file.stat()
+    return _read_pex_info(pex_file, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=None)
+def _read_pex_info(pex_file: Path, mtime_ns: int, size: int) -> Mapping[str, Any]:
+    if pex_file.is_dir():
+        data = (pex_file / "PEX-INFO").read_bytes()
+    else:
+        with zipfile.ZipFile(pex_file) as zf:
+            data = zf.read("PEX-INFO")
+    return cast(Mapping[str, Any], json.loads(data.decode()))
+
+
+# N.B.: The site-packages of a venv never change; so we discover them once when the venv is created
+# and record them, relative to the venv, in this file in the venv.
+_SITE_PACKAGES = ".pants_sitepackages"
+
+
+def _record_site_packages(venv: Path) -> None:
+    result = subprocess.run(
+        args=[
+            str(venv / "bin" / "python"),
+            "-c",
+            "import os, site; print(os.linesep.join(site.getsitepackages()))",
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    site_packages = venv / _SITE_PACKAGES
+    site_packages_tmp = venv / f"{_SITE_PACKAGES}.{uuid4().hex}"
+    site_packages_tmp.write_text(
+        "".join(
+            f"{os.path.relpath(entry, venv)}\n" for entry in result.stdout.decode().splitlines()
+        )
+    )
+    os.replace(site_packages_tmp, site_packages)
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_interpreter_constraint(constraint: str) -> Optional[Tuple[str, SpecifierSet]]:
+    match = re.match(r"^(?P<implementation>[A-Za-z]*)(?P<specifier>.*)$", constraint.strip())
+    if match is None:
+        return None
+    try:
+        return match.group("implementation").lower(), SpecifierSet(match.group("specifier"))
+    except InvalidSpecifier:
+        return None
+
+
+def _current_interpreter_satisfies(interpreter_constraints: Iterable[str]) -> bool:
+    """Returns `True` if the current interpreter is known to satisfy the interpreter constraints.
+
+    A `False` result only means that the interpreter constraints could not be evaluated locally and
+    the current interpreter may or may not satisfy them.
+    """
+    constraints = list(interpreter_constraints)
+    if not constraints:
+        return True
+
+    # N.B.: Like Pex, we match interpreter implementation names case-insensitively.
+    implementation = platform.python_implementation().lower()
+    version = ".".join(map(str, sys.version_info[:3]))
+    for constraint in constraints:
+        parsed = _parse_interpreter_constraint(constraint)
+        if parsed is None:
+            continue
+        constraint_implementation, specifier = parsed
+        if constraint_implementation in ("", implementation) and specifier.contains(version):
+            return True
+    return False
+
+
+# N.B.: Discovering all the interpreters compatible with a PEX can scan every interpreter on the
+# PATH; so we remember the result for retries of a failed mount. The PEX fingerprint and the PATH
+# are part of the key so that rebuilding the PEX or changing the PATH forces a re-discovery.
+@functools.lru_cache(maxsize=4)
+def _discover_interpreters(
+    pex: Pex, pex_to_mount: Path, pex_fingerprint: str, path_env: str
+) -> Tuple[Path, ...]:
+    return tuple(
+        Path(json.loads(line)["path"])
+        for line in pex.run_tool(
+            pex_to_mount, args=["interpreter", "--all", "-v"], stdout=subprocess.PIPE
+        )
+        .decode()
+        .splitlines()
+    )
+
+
+_HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def _content_fingerprint(*paths: Path) -> str:
+    """Returns a fingerprint of the contents of the given files."""
+    hasher = hashlib.sha256()
+    buffer = bytearray(_HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    for path in paths:
+        # N.B.: Interpreters and PEX files can be large; so we hash them in chunks read into a
+        # reused buffer instead of reading them into memory. We avoid memory maps since a file
+        # truncated while mapped kills the process with SIGBUS instead of just hashing stale data.
+        with path.open("rb", buffering=0) as fp:
+            while True:
+                read = fp.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(view[:read])
+    return hasher.hexdigest()
+
+
+def _stat_fingerprint(*paths: Path) -> str:
+    """Returns a fingerprint of the identity, size and modification time of the given files."""
+    hasher = hashlib.sha256()
+    for path in paths:
+        stat = path.stat()
+        hasher.update(
+            f"{path}:{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        )
+    return hasher.hexdigest()
 
 
 @dataclass
@@ -86,6 +254,17 @@ class PexManager:
 
     @classmethod
     def load(cls) -> "PexManager":
+        # N.B.: The fallback Pex is only needed for PEXes built by older Pex; so we prefetch it in
+        # a daemon thread that nothing waits on. Loading never blocks on the fallback download, and
+        # a later `fallback_pex` access either finds it cached or waits on the download lock. Any
+        # prefetch failure is ignored here and surfaces only if the fallback Pex is later needed.
+        def prefetch_fallback_pex() -> None:
+            try:
+                Pex.load(cls.FALLBACK_VERSION)
+            except Exception:
+                pass
+
+        threading.Thread(target=prefetch_fallback_pex, daemon=True).start()
         return cls(pex=Pex.load(cls.DEFAULT_VERSION))
 
     @property
@@ -95,82 +274,79 @@ class PexManager:
         return self._fallback_pex
 
     def unmount(self) -> Iterator[Path]:
-        for path_entry in self._env_mgr.unmount():
-            yield path_entry
-
-    def mount(self, pex_to_mount: Path) -> Iterator[Path]:
-        """Mounts the contents of the given PEX on the sys.path for importing."""
-        current_interpreter = Path(sys.executable)
-
-        hasher = hashlib.sha1()
-        hasher.update(current_interpreter.read_bytes())
-        hasher.update(pex_to_mount.read_bytes())
-        fingerprint = hasher.hexdigest()
+        return self._env_mgr.unmount()
 
+    def _create_venv(self, current_interpreter: Path, pex_to_mount: Path) -> Path:
+        """Creates a venv for the given PEX if one does not already exist and returns its path."""
+        # N.B.: Interpreters are very rarely replaced in place; so we identify the interpreter by its
+        # stat info to avoid hashing its contents. PEX files, on the other hand, are commonly
+        # overwritten by rebuilds; so we identify those by their contents.
+        interpreter_fingerprint = _stat_fingerprint(current_interpreter)
+        pex_fingerprint = _content_fingerprint(pex_to_mount)
+        fingerprint = hashlib.sha256(
+            f"{interpreter_fingerprint}:{pex_fingerprint}".encode()
+        ).hexdigest()
         venv = _CACHE / "venvs" / fingerprint / pex_to_mount.name
         with creation_lock(venv) as locked:
             if locked:
                 pex = self.pex
-
-                # Force the venv to select the current interpreter as the base interpreter or fail
-                # if it's not compatible with constraints.
-                def run_pex_tool(args: Iterable[str], **subprocess_args: Any) -> bytes:
-                    return (
-                        subprocess.run(
-                            args=[
-                                sys.executable,
-                                str(pex.exe),
-                                "-m",
-                                "pex.tools",
-                                str(pex_to_mount),
-                                *args,
-                            ],
-                            env=env.create(PEX_INTERPRETER=1, PEX_PYTHON_PATH=sys.executable),
-                            check=True,
-                            **subprocess_args,
-                        ).stdout
-                        or b""
-                    )
-
-                pex_info = json.loads(run_pex_tool(args=["info"], stdout=subprocess.PIPE).decode())
-                if "pex_hash" not in pex_info:
+                info = pex_info(pex_to_mount)
+                if "pex_hash" not in info:
                     pex = self.fallback_pex
 
-                selected_interpreter = json.loads(
-                    run_pex_tool(args=["interpreter", "-v"], stdout=subprocess.PIPE).decode()
-                )["path"]
-                if not current_interpreter.samefile(selected_interpreter):
-                    compatible_interpreters = [
-                        json.loads(line)["path"]
-                        for line in run_pex_tool(
-                            args=["interpreter", "--all", "-v"], stdout=subprocess.PIPE
-                        )
-                        .decode()
-                        .splitlines()
-                    ]
-                    interpreter_constraints = pex_info["interpreter_constraints"]
+                # N.B.: We can usually tell that the current interpreter satisfies the PEX's
+                # interpreter constraints without asking Pex to select an interpreter in a
+                # subprocess.
+                interpreter_constraints = info["interpreter_constraints"]
+                compatible = _current_interpreter_satisfies(interpreter_constraints)
+                if not compatible:
+                    selected_interpreter = json.loads(
+                        pex.run_tool(
+                            pex_to_mount, args=["interpreter", "-v"], stdout=subprocess.PIPE
+                        ).decode()
+                    )["path"]
+                    compatible = current_interpreter.samefile(selected_interpreter)
+                if not compatible:
                     raise self.IncompatibleError(
                         pex_to_mount,
                         interpreter_constraints=interpreter_constraints,
-                        compatible_interpreters=compatible_interpreters,
+                        compatible_interpreters=_discover_interpreters(
+                            pex,
+                            pex_to_mount,
+                            pex_fingerprint=pex_fingerprint,
+                            path_env=os.environ.get("PATH", ""),
+                        ),
                     )
                 venv_tmp = venv.parent / f"{venv.name}.{uuid4().hex}"
                 # N.B.: Some important libraries out there provide colliding console scripts which
                 # we don't use here anyhow; so we allow collisions which just emits warnings but
                 # does not fail the venv creation.
-                run_pex_tool(args=["venv", "--collisions-ok", str(venv_tmp)])
-                venv_tmp.rename(venv)
-
-        python = venv / "bin" / "python"
-        result = subprocess.run(
-            args=[
-                str(python),
-                "-c",
-                "import os, site; print(os.linesep.join(site.getsitepackages()))",
-            ],
-            stdout=subprocess.PIPE,
-            check=True,
+                pex.run_tool(pex_to_mount, args=["venv", "--collisions-ok", str(venv_tmp)])
+                _record_site_packages(venv_tmp)
+                finalize_creation(venv_tmp, venv)
+
+        return venv
+
+    def mount(self, pex_to_mount: Path) -> Iterator[Path]:
+        """Mounts the contents of the given PEX on the sys.path for importing."""
+        current_interpreter = Path(sys.executable)
+
+        # N.B.: Fingerprinting the contents of the interpreter and PEX is expensive; so we first
+        # look for a venv already created for the same files as identified by their stat info.
+        venv_index_entry = (
+            _CACHE / "venv-index" / _stat_fingerprint(current_interpreter, pex_to_mount)
         )
+        if venv_index_entry.exists():
+            venv = Path(os.readlink(venv_index_entry))
+        else:
+            venv = self._create_venv(current_interpreter, pex_to_mount)
+            venv_index_entry.parent.mkdir(parents=True, exist_ok=True)
+            venv_index_entry_tmp = (
+                venv_index_entry.parent / f"{venv_index_entry.name}.{uuid4().hex}"
+            )
+            os.symlink(venv, venv_index_entry_tmp)
+            os.replace(venv_index_entry_tmp, venv_index_entry)
 
-        for path_entry in self._env_mgr.mount(Path(p) for p in result.stdout.decode().splitlines()):
+        site_packages = (venv / _SITE_PACKAGES).read_text().splitlines()
+        for path_entry in self._env_mgr.mount(venv / entry for entry in site_packages):
             yield path_entry
@@ -1,37 +1,232 @@
 # Copyright 2021 Pants project contributors (see CONTRIBUTORS.md).
 # Licensed under the Apache License, Version 2.0 (see LICENSE).
 
-import asyncio
+import codecs
 import itertools
+import os
 import pathlib
-import random
+import re
+import secrets
+import select
 import shlex
-import string
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 from contextlib import contextmanager
-from dataclasses import dataclass
-from typing import Any, Awaitable, Callable, Iterable, Iterator, Optional, Tuple
+from dataclasses import dataclass, field, replace
+from typing import (
+    IO,
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
 import ipywidgets
-import nest_asyncio
 from IPython.core.magic import Magics, line_magic, magics_class
 from IPython.display import Javascript, display
 
-# TODO: replace or vendor these.
-from twitter.common.contextutil import environment_as, temporary_dir
-
 from pants_jupyter_plugin.pex import Pex, PexManager
 
+_T = TypeVar("_T")
+
 FAIL_GLYPH = "✗"
 SUCCESS_GLYPH = "✓"
 SPINNER_SEQ = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
 
 
+def _mtime_ns(path: pathlib.Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _environment_as(**env_vars: str) -> Iterator[None]:
+    """Sets the given environment variables for the duration of the context."""
+    saved = {name: os.environ.get(name) for name in env_vars}
+    os.environ.update(env_vars)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _find_by_suffix(root: bytes, suffix: bytes) -> Iterator[bytes]:
+    """Lazily yields the paths of all entries under root whose names end with suffix."""
+    # N.B.: We walk with os.scandir since its entries carry their type; so, unlike with rglob, we
+    # need neither a stat per entry nor a Path object per entry. We also walk in bytes to skip
+    # decoding the name of every entry we pass over.
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.endswith(suffix):
+                yield entry.path
+            if entry.is_dir(follow_symlinks=False):
+                yield from _find_by_suffix(entry.path, suffix)
+
+
+_ANSI_ESCAPE_RE = re.compile(r"\x1b\[[0-9;]*m")
+_WROTE_RE = re.compile(r"\bWrote (?P<path>.+?)\s*$", re.MULTILINE)
+
+
+@dataclass
+class _WrittenPaths:
+    """Collects the paths a build reports writing from its output as the output streams by."""
+
+    paths: List[str] = field(default_factory=list)
+    _partial_line: str = ""
+
+    def feed(self, text: str) -> None:
+        """Scans the complete lines of text, holding back any trailing partial line."""
+        text = self._partial_line + text
+        end = text.rfind("\n") + 1
+        self._partial_line = text[end:]
+        self._scan(text[:end])
+
+    def flush(self) -> None:
+        """Scans any trailing partial line once the output is exhausted."""
+        self._scan(self._partial_line)
+        self._partial_line = ""
+
+    def _scan(self, lines: str) -> None:
+        if "Wrote " in lines:
+            lines = _ANSI_ESCAPE_RE.sub("", lines)
+            self.paths.extend(match.group("path") for match in _WROTE_RE.finditer(lines))
+
+
+def _written_binary(
+    written: Iterable[str], cwd: Optional[pathlib.Path], build_dir: pathlib.Path, extension: str
+) -> Optional[pathlib.PosixPath]:
+    """Returns the binary a build reported writing to build_dir if it reported exactly one."""
+    suffix = f".{extension}"
+    build_dir_prefix = os.path.join(build_dir, "")
+    binaries = {
+        binary
+        for binary in (
+            os.path.normpath(os.path.join(cwd or os.getcwd(), path))
+            for path in written
+            if path.endswith(suffix)
+        )
+        if binary.startswith(build_dir_prefix)
+    }
+    if len(binaries) != 1:
+        return None
+    binary = binaries.pop()
+    return pathlib.PosixPath(binary) if os.path.exists(binary) else None
+
+
 @dataclass(frozen=True)
 class _PantsRepo:
     path: pathlib.Path
     is_pants_v2: bool
+    validated_at: float
+
+
+# All console output widgets share this class for styling and auto-scrolling.
+_CONSOLE_CLASS = "nb-console-output"
+
+_TERMINAL_STYLING = (
+    "<style>"
+    f".{_CONSOLE_CLASS} {{ background-color: black;}} "
+    f".{_CONSOLE_CLASS} pre {{ color: white; }}"
+    "</style>"
+)
+
+# N.B.: The script installs a single MutationObserver per page that all console output widgets
+# register with; so only the final registration line varies between widgets. It's still sent with
+# every widget, along with the styling, so that each cell's output is self-contained and survives
+# other cells being cleared or the page being reloaded.
+_AUTO_SCROLL_SCRIPT = (
+    """
+if (!window.pantsJupyterPluginAutoScroll) {
+  const config = { childList: true, subtree: true };
+  const callback = function(mutationsList, observer) {
+    for(let mutation of mutationsList) {
+        if (mutation.type === 'childList') {
+            var target = mutation.target;
+            if (target.nodeType !== Node.ELEMENT_NODE) {
+              target = target.parentElement;
+            }
+            var scrollContainer = target && target.closest(".%s");
+            if (scrollContainer) {
+              scrollContainer.scrollTop = scrollContainer.scrollHeight;
+            }
+        }
+    }
+  };
+  const observer = new MutationObserver(callback);
+  window.pantsJupyterPluginAutoScroll = function(uniqueClass, retry = true) {
+    const accordion = document.querySelector("." + uniqueClass);
+    if (accordion) {
+      accordion.parentElement.style.backgroundColor = "black";
+      observer.observe(accordion, config);
+    } else if (retry) {
+      // Add a small delay in case the element is not available on the DOM yet
+      window.setTimeout(() => window.pantsJupyterPluginAutoScroll(uniqueClass, false), 100);
+    }
+  };
+}
+"""
+    % _CONSOLE_CLASS
+)
+
+
+# N.B.: Each display of output in a widget incurs a front-end update; so we batch streamed output up
+# to this many characters or for this many seconds, whichever comes first, before displaying it.
+_FLUSH_SIZE = 4096
+_FLUSH_DELAY = 0.05
+
+# The maximum number of bytes of subprocess output to read at a time.
+_READ_SIZE = 64 * 1024
+
+
+def _stream_output(stream: IO[bytes], display: Callable[[str], None]) -> None:
+    """Displays everything read from the given stream in batches until it's exhausted."""
+    fd = stream.fileno()
+    # N.B.: The decoder holds back any trailing partial multi-byte character for the next chunk.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending: List[str] = []
+    pending_size = 0
+    flush_at: Optional[float] = None
+    while True:
+        if flush_at is not None:
+            timeout = max(0.0, flush_at - time.monotonic())
+            readable, _, _ = select.select([fd], [], [], timeout)
+            if not readable:
+                display("".join(pending))
+                pending.clear()
+                pending_size = 0
+                flush_at = None
+                continue
+
+        chunk = os.read(fd, _READ_SIZE)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            pending.append(text)
+            pending_size += len(text)
+            if flush_at is None:
+                flush_at = time.monotonic() + _FLUSH_DELAY
+        if pending and (not chunk or pending_size >= _FLUSH_SIZE):
+            display("".join(pending))
+            pending.clear()
+            pending_size = 0
+            flush_at = None
+        if not chunk:
+            return
 
 
 @magics_class
@@ -40,7 +235,13 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
 
     # Capture the state of sys.modules at load time. This helps us avoid
     # scrubbing important Jupyter libraries from the running kernel.
-    _ORIGINATING_SYS_MODULES_KEYS = tuple(k for k in sys.modules.keys())
+    _ORIGINATING_SYS_MODULES_KEYS = frozenset(sys.modules)
+
+    # The pants versions of the pants repos seen so far keyed by repo path and config mtimes.
+    _PANTS_VERSIONS: ClassVar[Dict[Tuple[str, Tuple[Optional[int], ...]], str]] = {}
+
+    # The number of seconds a pants repo stays valid after it was last validated.
+    _PANTS_REPO_VALIDATION_TTL = 5.0
 
     class SubprocessFailure(Exception):
         """Raised when a subprocess fails to execute."""
@@ -65,19 +266,21 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
     ) -> pathlib.PosixPath:
         """Extracts exactly 1 binary from a dir and returns a Path."""
         assert build_dir.is_dir(), f"build_dir {build_dir} was not a dir!"
-        # N.B. It's important we use pathlib.Path.rglob (recursive) here, since pants v2 prefixes
-        # dist dirs with their address namespace.
-        binaries = list(build_dir.rglob(f"*.{extension}"))
-        if len(binaries) != 1:
+        # N.B. It's important we search recursively here, since pants v2 prefixes dist dirs with
+        # their address namespace.
+        # We only need to know whether there is exactly 1 binary; so we stop walking at the second.
+        binaries = _find_by_suffix(os.fsencode(build_dir), os.fsencode(f".{extension}"))
+        binary = next(binaries, None)
+        if binary is None or next(binaries, None) is not None:
             raise self.BuildFailure(
                 "failed to select deterministic build artifact from workdir, needed 1 binary file "
-                f"with extension {extension} but found {len(binaries)}. Is the BUILD target a "
-                "binary (pex) output type?"
+                f"with extension {extension} but found {'none' if binary is None else 'several'}. "
+                "Is the BUILD target a binary (pex) output type?"
             )
-        return binaries[0]
+        return pathlib.PosixPath(os.fsdecode(binary))
 
     def _append_random_id(self, base_name: str, random_id_length: int = 5) -> str:
-        random_id = "".join(random.choice(string.ascii_letters) for n in range(random_id_length))
+        random_id = secrets.token_hex((random_id_length + 1) // 2)[:random_id_length]
         return f"{base_name}-{random_id}"
 
     @contextmanager
@@ -86,40 +289,9 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
     ) -> Iterator[Tuple[Callable[[], None], Callable[[], None], Callable[[str], None]]]:
         """Creates an Accordion widget and yields under care of its output capturer."""
         # Generate unique class for multiple invocations
-        unique_class = self._append_random_id("nb-console-output")
-        auto_scroll_script = """
-    const config = { childList: true, subtree: true };
-    const callback = function(mutationsList, observer) {
-      for(let mutation of mutationsList) {
-          if (mutation.type === 'childList') {
-              var scrollContainer = document.querySelector(".%s");
-              scrollContainer.scrollTop = scrollContainer.scrollHeight;
-          }
-      }
-    };
-    const addObserver = function() {
-      const accordion = document.querySelector(".%s");
-      accordion.parentElement.style.backgroundColor = "black";
-      observer.observe(accordion, config);
-    }
-    const observer = new MutationObserver(callback);
-    if (document.querySelector(".%s")) {
-      addObserver();
-    } else {
-      // Add a small delay in case the element is not available on the DOM yet
-      window.setTimeout(addObserver, 100);
-    }
-    """ % (
-            unique_class,
-            unique_class,
-            unique_class,
-        )
-
-        terminal_styling = (
-            "<style>"
-            f".{unique_class} {{ background-color: black;}} "
-            f".{unique_class} pre {{ color: white; }}"
-            "</style>"
+        unique_class = self._append_random_id(_CONSOLE_CLASS)
+        auto_scroll_script = (
+            f"{_AUTO_SCROLL_SCRIPT}window.pantsJupyterPluginAutoScroll({unique_class!r});\n"
         )
 
         def set_output_glyph(glyph: str) -> None:
@@ -134,9 +306,10 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
 
         layout = ipywidgets.Layout(height=height, overflow_y="scroll")
         outputter = ipywidgets.Output(layout=layout)
+        outputter.add_class(_CONSOLE_CLASS)
         outputter.add_class(unique_class)
         outputter.append_display_data(Javascript(auto_scroll_script))
-        outputter.append_display_data(ipywidgets.HTML(terminal_styling))
+        outputter.append_display_data(ipywidgets.HTML(_TERMINAL_STYLING))
 
         folder = ipywidgets.Accordion(children=[outputter])
         folder.selected_index = None if collapsed is True else 0
@@ -148,61 +321,62 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
         with outputter:
             yield expand, collapse, set_output_glyph
 
+    def _run_with_spinner(
+        self,
+        func: Callable[[], _T],
+        set_glyph: Callable[[str], None],
+        seq: str = SPINNER_SEQ,
+        spin_refresh_rate: float = 0.3,
+    ) -> _T:
+        """Runs the given function to completion while spinning the given glyph setter."""
+        done = threading.Event()
+
+        def spin() -> None:
+            for glyph in itertools.cycle(seq):
+                set_glyph(glyph)
+                if done.wait(spin_refresh_rate):
+                    return
+
+        # N.B.: The spinner is a pure UI side effect; so we spin it from a background thread and
+        # leave the main thread free to do the work and to receive any KeyboardInterrupt.
+        spinner = threading.Thread(target=spin, daemon=True)
+        spinner.start()
+        try:
+            return func()
+        finally:
+            done.set()
+            spinner.join()
+
     def _stream_binary_build_with_output(
         self,
-        cmd: str,
+        args: Sequence[str],
         title: str,
         work_dir: pathlib.PosixPath,
         extension: str,
-        spin_refresh_rate: float = 0.3,
+        cwd: Optional[pathlib.Path] = None,
     ) -> pathlib.PosixPath:
         """Runs a pex-producing command with streaming output and returns the pex location."""
-
-        async def spin_driver(
-            set_glyph: Callable[[str], None], is_complete: asyncio.Event, seq: str = SPINNER_SEQ
-        ) -> None:
-            spin_provider = itertools.cycle(seq)
-            while not is_complete.is_set():
-                set_glyph(next(spin_provider))
-                await asyncio.sleep(spin_refresh_rate)
-
-        async def async_exec(
-            display: Callable[[str], None], cmd: str, is_complete: asyncio.Event
-        ) -> int:
-            p = await asyncio.create_subprocess_shell(
-                cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
-            )
-
-            # N.B.: p.stdout can technically be None and the typing is not sophisticated enough to
-            # provide overloads for literals, so we simply guard the pump.
-            if isinstance(p.stdout, asyncio.StreamReader):
-                while True:
-                    line = await p.stdout.readline()
-                    if not line:
-                        break
-                    display(line.decode())
-
-            try:
-                return_code = await p.wait()
-            finally:
-                is_complete.set()
-
-            return return_code
-
-        def run_async(executor: Awaitable[int], spinner: Awaitable[None]) -> None:
-            nest_asyncio.apply()
-            loop = asyncio.get_event_loop()
-            tasks: Iterable[Awaitable[Any]] = [executor, spinner]
-            finished, unfinished = loop.run_until_complete(
-                asyncio.wait(tasks, return_when=asyncio.ALL_COMPLETED)
-            )
-            assert len(finished) == 2, f"unexpected async execution results: finished={finished}"
-            assert not unfinished, f"unexpected async execution results: unfinished={unfinished}"
-
-            results = [r for r in [task.result() for task in finished] if r is not None]
-            assert len(results) == 1, f"unexpected results: {results}"
-            return_code = results[0]
-
+        cmd = " ".join(map(shlex.quote, args))
+
+        # N.B.: Pants v2 reports the paths of the artifacts it writes; so we note these as we go to
+        # avoid searching for the artifact after the build.
+        written = _WrittenPaths()
+
+        def display(text: str) -> None:
+            self._display_line(text)
+            written.feed(text)
+
+        def execute() -> int:
+            with subprocess.Popen(
+                args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd
+            ) as process:
+                assert process.stdout is not None
+                _stream_output(process.stdout, display)
+                written.flush()
+                return process.wait()
+
+        def run(set_glyph: Callable[[str], None]) -> None:
+            return_code = self._run_with_spinner(execute, set_glyph)
             if return_code != 0:
                 raise self.SubprocessFailure(
                     f"command `{cmd}` failed with exit code {return_code}", return_code=return_code
@@ -210,14 +384,12 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
 
         with self._accordion_widget(title, collapsed=False) as (expand, collapse, set_output_glyph):
             self._display_line(f"$ {cmd}\n")
-            is_complete = asyncio.Event()
 
             try:
-                run_async(
-                    async_exec(self._display_line, cmd, is_complete),
-                    spin_driver(set_output_glyph, is_complete),
-                )
-                resulting_binary = self._extract_resulting_binary(work_dir, extension)
+                run(set_output_glyph)
+                resulting_binary = _written_binary(
+                    written.paths, cwd=cwd, build_dir=work_dir, extension=extension
+                ) or self._extract_resulting_binary(work_dir, extension)
                 self._display_line(f"\nSuccessfully built {resulting_binary}")
 
                 set_output_glyph(SUCCESS_GLYPH)
@@ -233,17 +405,23 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
 
     def _run_pex(self, requirements: str) -> pathlib.PosixPath:
         """Runs pex with widget UI display."""
-        with temporary_dir(cleanup=False) as tmp_dir:
-            tmp_path = pathlib.PosixPath(tmp_dir)
-            output_pex = tmp_path.joinpath("requirements.pex")
-            title = f"[Resolve] {requirements}"
-            safe_requirements = " ".join(shlex.quote(r) for r in shlex.split(requirements))
-            # TODO: Add support for toggling `--no-pypi` and find-links/index configs.
-            cmd = (
-                f"{self._pex_manager.pex.exe} -vv --python {sys.executable} "
-                f'-o "{output_pex}" {safe_requirements}'
-            )
-            return self._stream_binary_build_with_output(cmd, title, tmp_path, extension="pex")
+        # N.B.: The build dir is left behind on purpose; the resulting pex is mounted from it.
+        tmp_dir = tempfile.mkdtemp()
+        output_pex = os.path.join(tmp_dir, "requirements.pex")
+        title = f"[Resolve] {requirements}"
+        # TODO: Add support for toggling `--no-pypi` and find-links/index configs.
+        args = [
+            str(self._pex_manager.pex.exe),
+            "-vv",
+            "--python",
+            sys.executable,
+            "-o",
+            output_pex,
+            *shlex.split(requirements),
+        ]
+        return self._stream_binary_build_with_output(
+            args, title, pathlib.PosixPath(tmp_dir), extension="pex"
+        )
 
     def _run_pants(
         self, pants_repo: _PantsRepo, pants_target: str, extension: str
@@ -254,29 +432,26 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
         if pants_repo.is_pants_v2:
             goal_name = "package"
             # N.B. pants v2 doesn't support `--pants-distdir` outside of the build root.
-            dist_dir = pants_repo.path.joinpath("dist")
-            # N.B. The dist dir must exist for temporary_dir.
-            dist_dir.mkdir(exist_ok=True)
-            tmp_root = str(dist_dir)
+            tmp_root = os.path.join(pants_repo.path, "dist")
+            # N.B. The dist dir must exist for mkdtemp.
+            os.makedirs(tmp_root, exist_ok=True)
         else:
             goal_name = "binary"
             tmp_root = None
 
-        with temporary_dir(root_dir=tmp_root, cleanup=False) as tmp_dir:
-            title = f"[Build] ./pants {goal_name} {pants_target}"
-            cmd = (
-                f"cd {pants_repo.path} && ./pants --pants-distdir={tmp_dir!r} "
-                f"{goal_name} {pants_target}"
-            )
-            tmp_path = pathlib.PosixPath(tmp_dir)
-            return self._stream_binary_build_with_output(cmd, title, tmp_path, extension=extension)
+        tmp_dir = tempfile.mkdtemp(dir=tmp_root)
+        title = f"[Build] ./pants {goal_name} {pants_target}"
+        args = ["./pants", f"--pants-distdir={tmp_dir}", goal_name, *shlex.split(pants_target)]
+        return self._stream_binary_build_with_output(
+            args, title, pathlib.PosixPath(tmp_dir), extension=extension, cwd=pants_repo.path
+        )
 
     def _bootstrap_pex(self, pex_path: pathlib.PosixPath) -> None:
         """Bootstraps a pex with widget UI display."""
         title = f"[Bootstrap] {pex_path.name}"
         with self._accordion_widget(title) as (expand, collapse, set_output_glyph):
             try:
-                with environment_as(PEX_VERBOSE="2"):
+                with _environment_as(PEX_VERBOSE="2"):
                     # Scrub the environment.
 
                     self._display_line(
@@ -340,6 +515,53 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
         """Validates a given or stored path is a valid pants repo."""
         return pants_repo.is_dir() and pants_repo.joinpath("pants").is_file()
 
+    def _pants_version(self, pants_repo: pathlib.Path) -> str:
+        """Returns the version of pants used by the given pants repo."""
+        # N.B.: Running `./pants --version` can take seconds; so we only re-run it when the pants
+        # script or the config files that may pin its version have changed.
+        key = (
+            str(pants_repo),
+            tuple(_mtime_ns(pants_repo / name) for name in ("pants", "pants.toml", "pants.ini")),
+        )
+        version_string = self._PANTS_VERSIONS.get(key)
+        if version_string is None:
+
+            def get_version() -> "subprocess.CompletedProcess[bytes]":
+                return subprocess.run(
+                    ["./pants", "--version"],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    cwd=pants_repo,
+                )
+
+            # N.B.: Pants can take a while to bootstrap itself; so we show a spinner meanwhile.
+            result: Optional["subprocess.CompletedProcess[bytes]"] = None
+            title = f"[Version] {pants_repo}"
+            with self._accordion_widget(title) as (expand, collapse, set_output_glyph):
+                self._display_line("$ ./pants --version\n")
+                result = self._run_with_spinner(get_version, set_output_glyph)
+                if result.returncode != 0:
+                    set_output_glyph(FAIL_GLYPH)
+                    expand()
+                    self._display_line(result.stderr.decode())
+                else:
+                    self._display_line(result.stdout.decode())
+                    set_output_glyph(SUCCESS_GLYPH)
+                    collapse()
+
+            # N.B.: The output widget swallows exceptions raised under it; so we raise outside.
+            if result is None:
+                raise self.SubprocessFailure("`pants --version` failed to run. See output above.")
+            if result.returncode != 0:
+                raise self.SubprocessFailure(
+                    f"`pants --version` failed with:\n{result.stderr.decode()}",
+                    return_code=result.returncode,
+                )
+            version_string = result.stdout.decode().strip()
+            self._PANTS_VERSIONS[key] = version_string
+        return version_string
+
     @line_magic  # type: ignore[misc]  # IPython.core.magic is untyped.
     def pants_repo(self, pants_repo: str) -> None:
         """magic: %pants_repo: defines a pants repo path for subsequent use by %pants_load."""
@@ -354,24 +576,12 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
             return
 
         # Version check for pants v1 vs v2 flags/behavior.
-        version_process = subprocess.run(
-            ["./pants", "--version"],
-            stdin=subprocess.DEVNULL,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=pants_repo,
-        )
-        if version_process.returncode != 0:
-            raise self.SubprocessFailure(
-                f"`pants --version` failed with:\n{version_process.stderr.decode()}",
-                return_code=version_process.returncode,
-            )
-        version_string = version_process.stdout.decode().strip()
+        pants_repo_path = pants_repo_path.absolute()
+        version_string = self._pants_version(pants_repo_path)
         is_pants_v2 = version_string.startswith("2")
 
         self._display_line(f"Using pants {version_string} in repo at: {pants_repo}\n")
-        pants_repo_path = pants_repo_path.absolute()
-        self._pants_repo = _PantsRepo(pants_repo_path, is_pants_v2)
+        self._pants_repo = _PantsRepo(pants_repo_path, is_pants_v2, validated_at=time.monotonic())
 
     @line_magic  # type: ignore[misc]  # IPython.core.magic is untyped.
     def pants_load(self, pants_target: str) -> None:
@@ -388,12 +598,16 @@ class _PexEnvironmentBootstrapper(Magics):  # type: ignore[misc]  # IPython.core
             self._display_line("Usage: %pants_load <pants target>\n")
             return
 
-        if not self._validate_pants_repo(self._pants_repo.path):
-            self._display_line(
-                f"ERROR: {self._pants_repo.path} does not appear to be a valid pants repo. "
-                f"Check that the path is a repo with a pants script or executable.\n"
-            )
-            return
+        # N.B.: A pants repo rarely goes away; so we skip re-validating one validated recently.
+        now = time.monotonic()
+        if now - self._pants_repo.validated_at >= self._PANTS_REPO_VALIDATION_TTL:
+            if not self._validate_pants_repo(self._pants_repo.path):
+                self._display_line(
+                    f"ERROR: {self._pants_repo.path} does not appear to be a valid pants repo. "
+                    f"Check that the path is a repo with a pants script or executable.\n"
+                )
+                return
+            self._pants_repo = replace(self._pants_repo, validated_at=now)
 
         resulting_pex = self._run_pants(self._pants_repo, pants_target, "pex")
         if not resulting_pex:
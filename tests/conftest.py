@@ -1,19 +1,23 @@
 # Copyright 2021 Pants project contributors (see CONTRIBUTORS.md).
 # Licensed under the Apache License, Version 2.0 (see LICENSE).
 
+import functools
+import hashlib
 import json
+import os
 import shutil
 import subprocess
 import sys
 from dataclasses import dataclass
 from pathlib import Path
 from textwrap import dedent
-from typing import Dict, Iterator, Optional, Tuple
+from typing import Iterator, Mapping, Optional, Sequence, Tuple
 
 import pytest
 from _pytest.tmpdir import TempPathFactory
 
 from pants_jupyter_plugin import env
+from pants_jupyter_plugin.lock import creation_lock, finalize_creation
 from pants_jupyter_plugin.pex import Pex, PexManager
 
 
@@ -21,30 +25,94 @@ def load_pex() -> Pex:
     return PexManager.load().pex
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def pex() -> Pex:
     return load_pex()
 
 
-_INTERPRETER_CACHE: Dict[Pex, Tuple[Path, ...]] = {}
+@pytest.fixture(scope="session")
+def ipython_env(tmp_path_factory: TempPathFactory) -> Mapping[str, str]:
+    # N.B.: A private IPYTHONDIR ensures the user's IPython profile, startup files and history
+    # database can neither perturb nor slow down the tests.
+    return env.create(IPYTHONDIR=tmp_path_factory.mktemp("ipython"))
+
+
+@pytest.fixture(scope="session")
+def pex_cache(tmp_path_factory: TempPathFactory) -> Path:
+    if "PYTEST_XDIST_WORKER" in os.environ:
+        # N.B.: Each pytest-xdist worker gets its own base temp dir; so we share the cache one level
+        # up in the directory for the whole run. Concurrent builds of a PEX are serialized by the
+        # creation lock in `build_pex`.
+        cache = tmp_path_factory.getbasetemp().parent / "pex-cache"
+        cache.mkdir(exist_ok=True)
+        return cache
+    return tmp_path_factory.mktemp("pex-cache", numbered=False)
+
+
+def build_pex(
+    pex: Pex,
+    cache: Path,
+    requirements: Sequence[str],
+    interpreter_constraint: Optional[str] = None,
+) -> Path:
+    """Builds a PEX of the given requirements once per session, returning its path in the cache."""
+    key = hashlib.sha1(repr((tuple(requirements), interpreter_constraint)).encode()).hexdigest()
+    pex_file = cache / f"{key}.pex"
+    with creation_lock(pex_file) as locked:
+        if locked:
+            pex_tmp = pex_file.with_name(f"{pex_file.name}.tmp")
+            constraint_args = (
+                ["--interpreter-constraint", interpreter_constraint]
+                if interpreter_constraint
+                else []
+            )
+            subprocess.run([pex.exe, *requirements, *constraint_args, "-o", pex_tmp], check=True)
+            finalize_creation(pex_tmp, pex_file)
+    return pex_file
+
+
+CURRENT_INTERPRETER_VERSION = ".".join(map(str, sys.version_info[:3]))
+
+
+@pytest.fixture(scope="session")
+def colors_pex(pex: Pex, pex_cache: Path) -> Path:
+    return build_pex(pex, pex_cache, ["ansicolors==1.1.8"])
+
+
+@pytest.fixture(scope="session")
+def yaml_pex(pex: Pex, pex_cache: Path) -> Path:
+    return build_pex(pex, pex_cache, ["PyYAML==5.4.1"], interpreter_constraint="CPython>=3.6,<4")
+
+
+@pytest.fixture(scope="session")
+def yaml_pex_excluding_current(pex: Pex, pex_cache: Path) -> Path:
+    """A PyYAML PEX that is compatible with any CPython 3 interpreter save the current one."""
+    return build_pex(
+        pex,
+        pex_cache,
+        ["PyYAML==5.4.1"],
+        interpreter_constraint=f"CPython>=3.6,<4,!={CURRENT_INTERPRETER_VERSION}",
+    )
 
 
-def interpreters(pex: Optional[Pex] = None) -> Tuple[Path, ...]:
-    selected_pex: Pex = pex if pex is not None else load_pex()
-    pythons = _INTERPRETER_CACHE.get(selected_pex, None)
-    if pythons is None:
-        output = subprocess.check_output(
-            args=[str(selected_pex.exe), "interpreter", "--all", "-v"], env=env.create(PEX_TOOLS=1)
-        )
+@functools.lru_cache(maxsize=None)
+def _interpreters(pex: Pex) -> Tuple[Path, ...]:
+    args = (pex.exe, "interpreter", "--all", "-v")
+    with subprocess.Popen(
+        args=args, stdout=subprocess.PIPE, universal_newlines=True, env=env.create(PEX_TOOLS=1)
+    ) as process:
+        assert process.stdout is not None
+        pythons = tuple(Path(json.loads(line)["path"]) for line in process.stdout)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args)
+    return pythons
 
-        def iter_interpreters() -> Iterator[Path]:
-            for line in output.decode().splitlines():
-                yield Path(json.loads(line)["path"])
 
-        _INTERPRETER_CACHE[selected_pex] = pythons = tuple(iter_interpreters())
-    return pythons
+def interpreters(pex: Optional[Pex] = None) -> Tuple[Path, ...]:
+    return _interpreters(pex if pex is not None else load_pex())
 
 
+@functools.lru_cache(maxsize=None)
 def other_interpreters(pex: Optional[Pex] = None) -> Tuple[Path, ...]:
     current_interpreter = Path(sys.executable)
 
@@ -85,7 +153,11 @@ class PantsRepo:
         Pex.download_once(url, pants_exe)
 
         pants = build_root / "pants"
-        shutil.copy(pants_exe, pants)
+        # N.B.: The pants PEX is tens of MB; so we avoid copying it when we can.
+        try:
+            os.link(pants_exe, pants)
+        except OSError:
+            shutil.copy(pants_exe, pants)
         return cls(build_root=build_root, pants=pants)
 
 
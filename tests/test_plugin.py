@@ -1,43 +1,63 @@
 # Copyright 2021 Pants project contributors (see CONTRIBUTORS.md).
 # Licensed under the Apache License, Version 2.0 (see LICENSE).
 
+import os
+import platform
 import re
 import subprocess
 import sys
 from pathlib import Path
 from textwrap import dedent
-from typing import Optional
+from typing import List, Mapping, Optional
 
 import pytest
-from conftest import PantsRepo, other_interpreters
+from conftest import CURRENT_INTERPRETER_VERSION, PantsRepo, build_pex, other_interpreters
 
-from pants_jupyter_plugin.pex import Pex
+from pants_jupyter_plugin.pex import Pex, _current_interpreter_satisfies
+from pants_jupyter_plugin.plugin import _written_binary, _WrittenPaths
 
+_COMPATIBLE_COUNT_RE = re.compile(
+    rb"^There are (?P<count>\d+) compatible interpreters on this system:", re.M
+)
+_COMPATIBLE_INTERPRETER_RE = re.compile(rb"^(?P<index>\d+)\.\) (?P<interpreter>.*)$", re.M)
+
+# N.B.: Tests run against a private IPYTHONDIR; so there is no config worth loading (`--quick`).
+_IPYTHON = ("ipython", "--quick", "--no-banner", "--colors=NoColor")
+
+_LOAD_SCRIPT = dedent(
+    """\
+    try:
+        import {module}
+        raise AssertionError(
+            "Should not have been able to import {module} before loading {source}."
+        )
+    except ImportError:
+        # Expected.
+        pass
+
+    %load_ext pants_jupyter_plugin
+    {load}
+    import {module}
+    """
+)
 
-def test_pex_load(pex: Pex, tmpdir: Path) -> None:
-    pex_file = tmpdir / "colors.pex"
-    subprocess.run([str(pex.exe), "ansicolors==1.1.8", "-o", str(pex_file)], check=True)
+_INCOMPATIBLE_PEX_LOAD_SCRIPT = dedent(
+    """\
+    %load_ext pants_jupyter_plugin
+    %pex_load {pex_file}
+    import {module}
+    """
+)
+
+
+def test_pex_load(colors_pex: Path, ipython_env: Mapping[str, str]) -> None:
     subprocess.run(
         args=[
-            "ipython",
+            *_IPYTHON,
             "-c",
-            dedent(
-                f"""\
-                try:
-                    import colors
-                    raise AssertionError(
-                        "Should not have been able to import colors before loading {pex_file}."
-                    )
-                except ImportError:
-                    # Expected.
-                    pass
-
-                %load_ext pants_jupyter_plugin
-                %pex_load {pex_file}
-                import colors
-                """
-            ),
+            _LOAD_SCRIPT.format(module="colors", source=colors_pex, load=f"%pex_load {colors_pex}"),
         ],
+        env=ipython_env,
         check=True,
     )
 
@@ -45,41 +65,14 @@ def test_pex_load(pex: Pex, tmpdir: Path) -> None:
 @pytest.mark.skipif(
     not other_interpreters(), reason="Test requires at least one other interpreter to run."
 )
-def test_pex_load_correct_interpreter(pex: Pex, tmpdir: Path) -> None:
-    pex_file = tmpdir / "PyYAML.pex"
+def test_pex_load_correct_interpreter(yaml_pex: Path, ipython_env: Mapping[str, str]) -> None:
     subprocess.run(
         args=[
-            str(pex.exe),
-            "PyYAML==5.4.1",
-            "--interpreter-constraint",
-            "CPython>=3.6,<4",
-            "-o",
-            str(pex_file),
-        ],
-        check=True,
-    )
-
-    subprocess.run(
-        args=[
-            "ipython",
+            *_IPYTHON,
             "-c",
-            dedent(
-                f"""\
-                try:
-                    import yaml
-                    raise AssertionError(
-                        "Should not have been able to import yaml before loading {pex_file}."
-                    )
-                except ImportError:
-                    # Expected.
-                    pass
-
-                %load_ext pants_jupyter_plugin
-                %pex_load {pex_file}
-                import yaml
-                """
-            ),
+            _LOAD_SCRIPT.format(module="yaml", source=yaml_pex, load=f"%pex_load {yaml_pex}"),
         ],
+        env=ipython_env,
         check=True,
     )
 
@@ -87,122 +80,204 @@ def test_pex_load_correct_interpreter(pex: Pex, tmpdir: Path) -> None:
 @pytest.mark.skipif(
     not other_interpreters(), reason="Test requires at least one other interpreter to run."
 )
-def test_pex_load_correct_interpreter_not_available(pex: Pex, tmpdir: Path) -> None:
-    pex_file = tmpdir / "PyYAML.pex"
-    current_interpreter_version = ".".join(map(str, sys.version_info[:3]))
-    subprocess.run(
-        args=[
-            str(pex.exe),
-            "PyYAML==5.4.1",
-            "--interpreter-constraint",
-            f"CPython>=3.6,<4,!={current_interpreter_version}",
-            "-o",
-            str(pex_file),
-        ],
-        check=True,
-    )
+def test_pex_load_correct_interpreter_not_available(
+    yaml_pex_excluding_current: Path, ipython_env: Mapping[str, str]
+) -> None:
+    pex_file = yaml_pex_excluding_current
 
     result = subprocess.run(
         args=[
-            "ipython",
-            "--colors=NoColor",
+            *_IPYTHON,
             "-c",
-            dedent(
-                f"""\
-                %load_ext pants_jupyter_plugin
-                %pex_load {pex_file}
-                import yaml
-                """
-            ),
+            _INCOMPATIBLE_PEX_LOAD_SCRIPT.format(pex_file=pex_file, module="yaml"),
         ],
+        env=ipython_env,
         stdout=subprocess.PIPE,
     )
     assert result.returncode != 0
 
-    lines = set(result.stdout.decode().splitlines())
-    lines.remove(
-        f"IncompatibleError: The current interpreter {sys.executable} has version "
-        f"{current_interpreter_version}."
+    output = result.stdout
+
+    expected_report = (
+        f"\nIncompatibleError: The current interpreter {sys.executable} has version "
+        f"{CURRENT_INTERPRETER_VERSION}.\n"
+        f"This is not compatible with the PEX at {pex_file}.\n"
+        f"It has interpreter constraints CPython>=3.6,<4,!={CURRENT_INTERPRETER_VERSION}.\n"
+    )
+    assert expected_report.encode() in output
+
+    count_match = _COMPATIBLE_COUNT_RE.search(output)
+    assert count_match is not None
+    count = int(count_match.group("count"))
+
+    listed = [
+        (int(match.group("index")), Path(os.fsdecode(match.group("interpreter"))))
+        for match in _COMPATIBLE_INTERPRETER_RE.finditer(output)
+    ]
+    assert sorted(index for index, _ in listed) == list(range(1, count + 1))
+    interpreters = {interpreter for _, interpreter in listed}
+    assert len(interpreters) == count
+    assert interpreters <= set(other_interpreters())
+
+
+_IMPLEMENTATION = platform.python_implementation()
+_OTHER_IMPLEMENTATION = "PyPy" if _IMPLEMENTATION == "CPython" else "CPython"
+_MAJOR, _MINOR = sys.version_info[:2]
+
+
+@pytest.mark.parametrize(
+    "interpreter_constraints, expected",
+    [
+        pytest.param([], True, id="unconstrained"),
+        pytest.param([">=3.6"], True, id="bare-specifier"),
+        pytest.param([f"{_IMPLEMENTATION}>=3.6,<4"], True, id="implementation"),
+        pytest.param([f"{_OTHER_IMPLEMENTATION}>=3.6"], False, id="implementation-mismatch"),
+        pytest.param([f"!={CURRENT_INTERPRETER_VERSION}"], False, id="bare-exclusion"),
+        pytest.param(
+            [f"{_IMPLEMENTATION}>=3.6,<4,!={CURRENT_INTERPRETER_VERSION}"], False, id="exclusion"
+        ),
+        pytest.param([f"=={_MAJOR}.*"], True, id="major-wildcard"),
+        pytest.param([f"=={_MAJOR}.{_MINOR}.*"], True, id="minor-wildcard"),
+        pytest.param(["==2.*"], False, id="wildcard-mismatch"),
+        pytest.param(
+            [f"{_OTHER_IMPLEMENTATION}>=3.6", f"{_IMPLEMENTATION}>=3.6"], True, id="any-of"
+        ),
+        pytest.param([f"{_IMPLEMENTATION.lower()}>=3.6"], True, id="implementation-case"),
+        # N.B.: Constraints that can't be evaluated locally are deferred to Pex.
+        pytest.param([f"{_IMPLEMENTATION}[any]>=3.6"], False, id="unparseable-extras"),
+        pytest.param([f"{_IMPLEMENTATION}>=3.6 or so"], False, id="unparseable-specifier"),
+    ],
+)
+def test_current_interpreter_satisfies(interpreter_constraints: List[str], expected: bool) -> None:
+    assert expected is _current_interpreter_satisfies(interpreter_constraints)
+
+
+def test_pex_load_interpreter_selection_fallback(
+    pex: Pex, pex_cache: Path, ipython_env: Mapping[str, str]
+) -> None:
+    # N.B.: Pex parses interpreter constraints as requirements and so accepts (and ignores) extras
+    # which we cannot parse; so the current interpreter must be selected by `pex.tools interpreter`
+    # instead.
+    interpreter_constraint = f"{_IMPLEMENTATION}[any]>=3.6"
+    assert not _current_interpreter_satisfies([interpreter_constraint])
+    pex_file = build_pex(
+        pex, pex_cache, ["ansicolors==1.1.8"], interpreter_constraint=interpreter_constraint
     )
-    lines.remove(f"This is not compatible with the PEX at {pex_file}.")
-    lines.remove(f"It has interpreter constraints CPython>=3.6,<4,!={current_interpreter_version}.")
-
-    count = -1
-    for line in list(lines):
-        match = re.match(r"There are (?P<count>\d+) compatible interpreters on this system:", line)
-        if match is not None:
-            count = int(match.group("count"))
-            lines.remove(line)
-    assert count >= 0
-
-    indexes = set(range(1, count + 1))
-    interpreters = set(other_interpreters())
-    assert len(interpreters) >= count
-    assert len(lines) >= count
-    for line in lines:
-        match = re.match(r"^(?P<index>\d+)\.\) (?P<interpreter>.*)$", line)
-        if match is not None:
-            indexes.remove(int(match.group("index")))
-            interpreters.remove(Path(match.group("interpreter")))
-    assert len(indexes) == 0
-    assert len(interpreters) == len(other_interpreters()) - count
-
-
-def test_requirements_load() -> None:
     subprocess.run(
         args=[
-            "ipython",
+            *_IPYTHON,
             "-c",
-            dedent(
-                f"""\
-                try:
-                    import colors
-                    raise AssertionError(
-                        "Should not have been able to import colors before loading requirements."
-                    )
-                except ImportError:
-                    # Expected.
-                    pass
-
-                %load_ext pants_jupyter_plugin
-                %requirements_load "ansicolors==1.1.8"
-                import colors
-                """
+            _LOAD_SCRIPT.format(module="colors", source=pex_file, load=f"%pex_load {pex_file}"),
+        ],
+        env=ipython_env,
+        check=True,
+    )
+
+
+def test_requirements_load(ipython_env: Mapping[str, str]) -> None:
+    subprocess.run(
+        args=[
+            *_IPYTHON,
+            "-c",
+            _LOAD_SCRIPT.format(
+                module="colors",
+                source="requirements",
+                load='%requirements_load "ansicolors==1.1.8"',
             ),
         ],
+        env=ipython_env,
         check=True,
     )
 
 
-def check_pants_load(
-    pants_repo: PantsRepo,
+_PANTS_V1_BUILD = dedent(
+    """\
+    python_requirements()
+
+    python_binary(
+        name="pkginfo-bin",
+        dependencies=[
+            "//:pkginfo",
+        ],
+        entry_point="code:interact",
+    )
+    """
+)
+
+# Pants v1 uses older Pex and creates PEX files that we cannot inspect with PEX_TOOLS using Python
+# 3.10 or newer. This should be fine in practice since Pants v1 can't in general work with Python
+# 3.10 due to using older Pex; so using Python 3.10 or newer in a notebook that's meant to access
+# Pants v1 artifacts should not be expected to work either.
+_PANTS_V1_PY310_ERROR = dedent(
+    """\
+    No interpreter compatible with the requested constraints was found:
+      Version matches >=2.7,<3.10,!=3.0.*,!=3.1.*,!=3.2.*,!=3.3.*,!=3.4.*
+    """
+)
+
+_PANTS_V2_BUILD = dedent(
+    """\
+    python_requirements()
+
+    pex_binary(
+        name="colors-bin",
+        dependencies=[
+            "//:ansicolors",
+        ],
+        entry_point="<none>",
+    )
+    """
+)
+
+
+@pytest.mark.parametrize(
+    "repo_fixture, build, requirements, pex_target, expected_module, expected_error",
+    [
+        pytest.param(
+            "pants_v1_repo",
+            _PANTS_V1_BUILD,
+            "pkginfo==1.7.0",
+            "//:pkginfo-bin",
+            "pkginfo",
+            _PANTS_V1_PY310_ERROR if sys.version_info[:2] >= (3, 10) else None,
+            id="v1",
+        ),
+        pytest.param(
+            "pants_v2_repo",
+            _PANTS_V2_BUILD,
+            "ansicolors==1.1.8",
+            "//:colors-bin",
+            "colors",
+            None,
+            id="v2",
+        ),
+    ],
+)
+def test_pants_load(
+    request: pytest.FixtureRequest,
+    ipython_env: Mapping[str, str],
+    repo_fixture: str,
+    build: str,
+    requirements: str,
     pex_target: str,
     expected_module: str,
-    expected_error: Optional[str] = None,
+    expected_error: Optional[str],
 ) -> None:
+    pants_repo: PantsRepo = request.getfixturevalue(repo_fixture)
+    (pants_repo.build_root / "BUILD").write_text(build)
+    (pants_repo.build_root / "requirements.txt").write_text(requirements)
+
     result = subprocess.run(
         args=[
-            "ipython",
+            *_IPYTHON,
             "-c",
-            dedent(
-                f"""\
-                try:
-                    import {expected_module}
-                    raise AssertionError(
-                        "Should not have been able to import {expected_module} before loading via "
-                        "{pants_repo.pants}."
-                    )
-                except ImportError:
-                    # Expected.
-                    pass
-
-                %load_ext pants_jupyter_plugin
-                %pants_repo {pants_repo.build_root}
-                %pants_load {pex_target}
-                import {expected_module}
-                """
+            _LOAD_SCRIPT.format(
+                module=expected_module,
+                source=f"via {pants_repo.pants}",
+                load=f"%pants_repo {pants_repo.build_root}\n%pants_load {pex_target}",
             ),
         ],
+        env=ipython_env,
         stderr=subprocess.PIPE if expected_error else None,
         check=expected_error is None,
     )
@@ -210,64 +285,35 @@ def check_pants_load(
         assert expected_error in result.stderr.decode()
 
 
-def test_pants_v1_load(pants_v1_repo: PantsRepo) -> None:
-    build_root = pants_v1_repo.build_root
-
-    (build_root / "BUILD").write_text(
-        dedent(
-            f"""\
-            python_requirements()
-
-            python_binary(
-                name="pkginfo-bin",
-                dependencies=[
-                    "//:pkginfo",
-                ],
-                entry_point="code:interact",
-            )
-            """
-        )
-    )
-    (build_root / "requirements.txt").write_text("pkginfo==1.7.0")
-
-    expected_error = None
-    if sys.version_info[:2] >= (3, 10):
-        # Pants v1 uses older Pex and creates PEX files that we cannot inspect with PEX_TOOLS using
-        # Python 3.10 or newer. This should be fine in practice since Pants v1 can't in general work
-        # with Python 3.10 due to using older Pex; so using Python 3.10 or newer in a notebook
-        # that's meant to access Pants v1 artifacts should not be expected to work either.
-        expected_error = dedent(
-            """\
-            No interpreter compatible with the requested constraints was found:
-              Version matches >=2.7,<3.10,!=3.0.*,!=3.1.*,!=3.2.*,!=3.3.*,!=3.4.*
-            """
-        )
-    check_pants_load(
-        pants_repo=pants_v1_repo,
-        pex_target="//:pkginfo-bin",
-        expected_module="pkginfo",
-        expected_error=expected_error,
-    )
-
-
-def test_pants_v2_load(pants_v2_repo: PantsRepo) -> None:
-    build_root = pants_v2_repo.build_root
-
-    (build_root / "BUILD").write_text(
-        dedent(
-            f"""\
-            python_requirements()
-
-            pex_binary(
-                name="colors-bin",
-                dependencies=[
-                    "//:ansicolors",
-                ],
-                entry_point="<none>",
-            )
-            """
-        )
-    )
-    (build_root / "requirements.txt").write_text("ansicolors==1.1.8")
-
-    check_pants_load(pants_repo=pants_v2_repo, pex_target="//:colors-bin", expected_module="colors")
+def test_written_paths() -> None:
+    written = _WrittenPaths()
+    # N.B.: Pants colors its log lines and streamed output can split lines across batches.
+    written.feed("12:00:00.00 [INFO] \x1b[32mWro")
+    assert [] == written.paths
+    written.feed("te dist/colors-bin.pex\x1b[0m\n12:00:01.00 [INFO] Wrote dist/with space.pex")
+    assert ["dist/colors-bin.pex"] == written.paths
+    written.flush()
+    assert ["dist/colors-bin.pex", "dist/with space.pex"] == written.paths
+
+
+def test_written_binary(tmp_path: Path) -> None:
+    build_dir = tmp_path / "dist" / "build"
+    build_dir.mkdir(parents=True)
+    binary = build_dir / "colors-bin.pex"
+    binary.touch()
+    outside = tmp_path / "dist" / "other.pex"
+    outside.touch()
+
+    def written_binary(*written: str) -> Optional[Path]:
+        return _written_binary(written, cwd=tmp_path, build_dir=build_dir, extension="pex")
+
+    assert binary == written_binary("dist/build/colors-bin.pex")
+    assert binary == written_binary(str(binary), "dist/build/colors-bin.pex.json")
+    assert written_binary("dist/other.pex") is None
+    assert written_binary("dist/build/../other.pex") is None
+    assert written_binary("dist/build/missing.pex") is None
+    assert written_binary() is None
+
+    other_binary = build_dir / "other-bin.pex"
+    other_binary.touch()
+    assert written_binary("dist/build/colors-bin.pex", "dist/build/other-bin.pex") is None